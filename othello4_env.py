@@ -5,6 +5,10 @@ import sys
 import numpy as np
 
 
+# (x, y) steps to the 8 neighbouring spaces
+DIRECTIONS = ((0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1))
+
+
 # static methods
 def is_on_board(x, y):
     # Returns True if the coordinates are located on the board.
@@ -16,12 +20,37 @@ def is_on_corner(x, y):
     return (x == 0 and y == 0) or (x == 3 and y == 0) or (x == 0 and y == 3) or (x == 3 and y == 3)
 
 
+# The board is a flat bytearray of tile codes, space x, y is at index x * 4 + y.
+TILE_CODES = {' ': 0, 'X': 1, 'O': 2, '.': 3}
+TILES = ' XO.'  # inverse of TILE_CODES
+
+
+def build_rays():
+    # For every space, the lists of spaces walking out from it in each direction up to the board edge.
+    # Directions with fewer than 2 spaces are left out since they can never flip a tile.
+    rays = []
+    for x_start in range(4):
+        for y_start in range(4):
+            rays.append([])
+            for x_direction, y_direction in DIRECTIONS:
+                ray = []
+                x, y = x_start + x_direction, y_start + y_direction
+                while is_on_board(x, y):
+                    ray.append(x * 4 + y)
+                    x += x_direction
+                    y += y_direction
+                if len(ray) >= 2:
+                    rays[-1].append(ray)
+    return rays
+
+
+RAYS = build_rays()
+
+
 class Board:
 
     def __init__(self):
-        self.board = []
-        for _ in range(4):
-            self.board.append([' '] * 4)
+        self.board = bytearray(16)
         self.reset()
 
     def draw(self):
@@ -33,64 +62,41 @@ class Board:
         for y in range(4):
             print(y + 1, end=' ')
             for x in range(4):
-                print('| %s' % (self.board[x][y]), end='  ')
+                print('| %s' % (TILES[self.board[x * 4 + y]]), end='  ')
             print('|')
             print(h_line)
 
     def reset(self):
         # Blanks out the board it is passed, except for the original starting position.
-        for x in range(4):
-            for y in range(4):
-                self.board[x][y] = ' '
+        self.board[:] = bytes(16)
 
         # Starting pieces: X = black, O = white.
-        self.board[1][1] = 'X'
-        self.board[1][2] = 'O'
-        self.board[2][1] = 'O'
-        self.board[2][2] = 'X'
+        self.board[1 * 4 + 1] = TILE_CODES['X']
+        self.board[1 * 4 + 2] = TILE_CODES['O']
+        self.board[2 * 4 + 1] = TILE_CODES['O']
+        self.board[2 * 4 + 2] = TILE_CODES['X']
 
     def is_valid_move(self, tile, x_start, y_start):
         # Returns False if the player's move on space x_start, y_start is invalid.
         # If it is a valid move, returns a list of spaces that would become the player's if they made a move here.
-        if self.board[x_start][y_start] != ' ' or not is_on_board(x_start, y_start):
+        if not is_on_board(x_start, y_start) or self.board[x_start * 4 + y_start]:
             return False
 
-        self.board[x_start][y_start] = tile  # temporarily set the tile on the board.
-
+        own = TILE_CODES[tile]
         if tile == 'X':
-            other_tile = 'O'
+            other = TILE_CODES['O']
         else:
-            other_tile = 'X'
+            other = TILE_CODES['X']
 
         tiles_to_flip = []
-        for x_direction, y_direction in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
-            x, y = x_start, y_start
-            x += x_direction  # first step in the direction
-            y += y_direction  # first step in the direction
-            if is_on_board(x, y) and self.board[x][y] == other_tile:
-                # There is a piece belonging to the other player next to our piece.
-                x += x_direction
-                y += y_direction
-                if not is_on_board(x, y):
-                    continue
-                while self.board[x][y] == other_tile:
-                    x += x_direction
-                    y += y_direction
-                    if not is_on_board(x, y):  # break out of while loop, then continue in for loop
-                        break
-                if not is_on_board(x, y):
-                    continue
-                if self.board[x][y] == tile:
-                    # There are pieces to flip over. Go in the reverse direction until we reach the original space,
-                    # noting all the tiles along the way.
-                    while True:
-                        x -= x_direction
-                        y -= y_direction
-                        if x == x_start and y == y_start:
-                            break
-                        tiles_to_flip.append([x, y])
+        for ray in RAYS[x_start * 4 + y_start]:
+            # walk over the other player's pieces, the ray flips them if it then reaches one of ours
+            i = 0
+            while i < len(ray) and self.board[ray[i]] == other:
+                i += 1
+            if 0 < i < len(ray) and self.board[ray[i]] == own:
+                tiles_to_flip.extend(divmod(sq, 4) for sq in ray[:i])
 
-        self.board[x_start][y_start] = ' '  # restore the empty space
         if len(tiles_to_flip) == 0:  # If no tiles were flipped, this is not a valid move.
             return False
         return tiles_to_flip
@@ -107,15 +113,7 @@ class Board:
 
     def get_score(self):
         # Determine the score by counting the tiles. Returns a dictionary with keys 'X' and 'O'.
-        x_score = 0
-        o_score = 0
-        for x in range(4):
-            for y in range(4):
-                if self.board[x][y] == 'X':
-                    x_score += 1
-                elif self.board[x][y] == 'O':
-                    o_score += 1
-        return {'X': x_score, 'O': o_score}
+        return {'X': self.board.count(TILE_CODES['X']), 'O': self.board.count(TILE_CODES['O'])}
 
     def make_move(self, tile, x_start, y_start):
         # Place the tile on the board at x_start, y_start, and flip any of the opponent's pieces.
@@ -125,18 +123,16 @@ class Board:
         if not tiles_to_flip:
             return False
 
-        self.board[x_start][y_start] = tile
+        own = TILE_CODES[tile]
+        self.board[x_start * 4 + y_start] = own
         for x, y in tiles_to_flip:
-            self.board[x][y] = tile
+            self.board[x * 4 + y] = own
         return True
 
     def copy(self):
-        # Make a duplicate of the board list and return the duplicate.
+        # Make a duplicate of the board and return the duplicate.
         dupe_board = Board()
-
-        for x in range(4):
-            for y in range(4):
-                dupe_board.board[x][y] = self.board[x][y]
+        dupe_board.board[:] = self.board
 
         return dupe_board
 
@@ -146,30 +142,20 @@ class Board:
         dupe_board = self.copy()
 
         for x, y in dupe_board.get_valid_moves(tile):
-            dupe_board.board[x][y] = '.'
+            dupe_board.board[x * 4 + y] = TILE_CODES['.']
         return dupe_board
 
     def list_to_array(self):
-        state = np.zeros((4, 4))
-        for i in range(4):
-            for j in range(4):
-                if self.board[j][i] == 'X':
-                    state[i, j] = 1
-                elif self.board[j][i] == 'O':
-                    state[i, j] = -1
-                else:
-                    state[i, j] = 0
-        return state
+        # Returns an array indexed by [y, x] with 1 for X, -1 for O and 0 for empty spaces.
+        board = np.frombuffer(self.board, dtype=np.uint8).reshape(4, 4).T
+        return (board == TILE_CODES['X']).astype(np.int8) - (board == TILE_CODES['O']).astype(np.int8)
 
     def array_to_list(self, state):
-        for i in range(4):
-            for j in range(4):
-                if state[i, j] == 1:
-                    self.board[j][i] = 'X'
-                elif state[i, j] == -1:
-                    self.board[j][i] = 'O'
-                else:
-                    self.board[j][i] = ' '
+        # Inverse of list_to_array: loads the board from an array indexed by [y, x].
+        board = np.zeros((4, 4), dtype=np.uint8)
+        board[state == 1] = TILE_CODES['X']
+        board[state == -1] = TILE_CODES['O']
+        self.board[:] = board.T.tobytes()
         return self.board
 
 
@@ -283,15 +269,16 @@ class OthelloGame:
                 return possible_moves[0]
             else:
                 # TODO - update so that we choose the best afterstate, not just the best next position
+                # Score each afterstate by how much it changes the value of the board: the placed tile
+                # adds its space's value and every flipped tile swings its space's value twice.
+                sign = 1 if self.computer_tile == 'X' else -1
                 computer_afterstate_v = []
-                for i in range(len(possible_moves)):
-                    computer_afterstate_v.append(0)
-                    temp_board = self.board.copy()
-                    temp_board.make_move(self.computer_tile, possible_moves[i][0], possible_moves[i][1])
-                    for j in range(16):
-                        computer_afterstate_v[i] -= temp_board.list_to_array()[int(j / 4)][j % 4] * self.position_value[
-                            j]
-                best = int(np.argmax([computer_afterstate_v[k] for k in range(len(possible_moves))]))
+                for x, y in possible_moves:
+                    tiles_to_flip = self.board.is_valid_move(self.computer_tile, x, y)
+                    gain = self.position_value[y * 4 + x] + \
+                        2 * sum(self.position_value[fy * 4 + fx] for fx, fy in tiles_to_flip)
+                    computer_afterstate_v.append(-sign * gain)
+                best = int(np.argmax(computer_afterstate_v))
                 return possible_moves[best]
         else:
             return []
@@ -1,7 +1,6 @@
 from othello6_env import OthelloGame
 import tensorflow as tf
 import numpy as np
-from collections import deque
 from tensorflow.keras import layers
 from tensorflow.keras.optimizers import SGD
 from tensorflow.keras.initializers import RandomUniform
@@ -15,7 +14,15 @@ class OthelloAgent:
         self.state_size = 36
         self.action_size = 36
         self.tile = 'X'
-        self.memory = deque(maxlen=2000)
+        # replay memory as a ring buffer, one array per field (states are int8, cast to float32 for the model)
+        self.memory_size = 2000
+        self.states = np.zeros((self.memory_size, self.state_size), dtype=np.int8)
+        self.actions = np.zeros(self.memory_size, dtype=np.int32)
+        self.rewards = np.zeros(self.memory_size, dtype=np.float32)
+        self.next_states = np.zeros((self.memory_size, self.state_size), dtype=np.int8)
+        self.dones = np.zeros(self.memory_size, dtype=np.float32)
+        self.memory_ptr = 0  # next slot to write
+        self.memory_len = 0  # number of filled slots
         self.gamma = 1.0  # episodic --> undiscounted
         self.episodes = episodes
         self.epsilon = 0.1
@@ -34,7 +41,14 @@ class OthelloAgent:
         return model
 
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        i = self.memory_ptr
+        self.states[i] = state.ravel()
+        self.actions[i] = action[1]*6+action[0]
+        self.rewards[i] = reward
+        self.next_states[i] = next_state.ravel()
+        self.dones[i] = done
+        self.memory_ptr = (i + 1) % self.memory_size
+        self.memory_len = min(self.memory_len + 1, self.memory_size)
 
     def get_action(self, state, testing):
         valid_actions = game.board.get_valid_moves(self.tile)
@@ -43,7 +57,7 @@ class OthelloAgent:
             return valid_actions[0]
         else:
             # Take an action based on the Q function
-            all_values = self.model.predict(state)
+            all_values = self.model(state.astype(np.float32), training=False).numpy()
             # return the VALID action with the highest network value
             # use an action_grid that can be indexed by [x, y]
             action_grid = np.reshape(all_values[0], newshape=(6, 6))
@@ -56,15 +70,28 @@ class OthelloAgent:
         Only want to update the state-action pair that is selected (the target for all
                  other actions are set to the NN estimate so that the estimate is zero)
         """
-        minibatch = random.sample(self.memory, batch_size)
-        for state, action, reward, next_state, done in minibatch:
-            target = reward
-            if not done:
-                target = reward + self.gamma * \
-                         np.amax(self.model.predict(next_state)[0])
-            target_NN = self.model.predict(state)
-            target_NN[0][action[1]*6+action[0]] = target   # only this Q val will be updated
-            self.model.fit(state, target_NN, epochs=1, verbose=0)
+        minibatch = np.random.randint(0, self.memory_len, batch_size)
+        states = self.states[minibatch].astype(np.float32)
+        actions = self.actions[minibatch]
+        rewards = self.rewards[minibatch]
+        next_states = self.next_states[minibatch].astype(np.float32)
+        dones = self.dones[minibatch]
+
+        q_values = self.model(states, training=False).numpy()
+        q_next = self.model(next_states, training=False).numpy()
+        target_NN = q_values.copy()
+        # only the Q val of the selected action will be updated
+        target_NN[np.arange(batch_size), actions] = rewards + self.gamma * np.amax(q_next, axis=1) * (1 - dones)
+        self.train_step(states, target_NN)
+
+    @tf.function(jit_compile=True)
+    def train_step(self, states, targets):
+        # A single SGD step on the MSE loss, compiled with XLA
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_mean(tf.square(self.model(states, training=True) - targets))
+        gradients = tape.gradient(loss, self.model.trainable_variables)
+        self.model.optimizer.apply_gradients(zip(gradients, self.model.trainable_variables))
+        return loss
 
     def epsilon_decay(self):
         # linear epsilon decay feature
@@ -186,7 +213,7 @@ if __name__ == "__main__":
                     break
                 # Question - maybe only update every batch_size moves
                 #       (instead of every move after batch_size)?
-                if len(agent.memory) > batch_size:
+                if agent.memory_len > batch_size:
                     agent.replay(batch_size)
 
             agent.epsilon_decay()
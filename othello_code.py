@@ -4,6 +4,10 @@ import random
 import sys
 
 
+# (x, y) steps to the 8 neighbouring spaces
+DIRECTIONS = ((0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1))
+
+
 def draw_board(board):
     # This function prints out the board that it was passed. Returns None.
     HLINE = '  +-----+-----+-----+-----+-----+-----+-----+-----+'
@@ -57,7 +61,7 @@ def is_valid_move(board, tile, xstart, ystart):
         otherTile = 'X'
 
     tilesToFlip = []
-    for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
+    for xdirection, ydirection in DIRECTIONS:
         x, y = xstart, ystart
         x += xdirection  # first step in the direction
         y += ydirection  # first step in the direction
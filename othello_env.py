@@ -2,7 +2,9 @@
 
 import random
 import sys
+from functools import lru_cache
 import numpy as np
+from othello_kernels import gen_moves, gen_flips
 
 
 # static methods
@@ -16,14 +18,46 @@ def is_on_corner(x, y):
     return (x == 0 and y == 0) or (x == 7 and y == 0) or (x == 0 and y == 7) or (x == 7 and y == 7)
 
 
+def _iter_bits(bb):
+    # Yields the index of every set bit of the bitboard, lowest first.
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+@lru_cache(maxsize=1 << 16)
+def cached_moves(own, opp):
+    # gen_moves memoized on the position, positions recur a lot across episodes.
+    return gen_moves(own, opp)
+
+
 class Board:
+    # The board is stored as two 64-bit bitboards, one per player. Square (x, y) maps to bit y * 8 + x.
 
     def __init__(self):
-        self.board = []
-        for _ in range(8):
-            self.board.append([' '] * 8)
+        self.black = 0  # 'X' stones
+        self.white = 0  # 'O' stones
+        self.hints = 0  # squares drawn as '.', only used for player interaction
+        self._moves = {}  # tile -> valid moves bitboard for the current position
         self.reset()
 
+    @property
+    def board(self):
+        # Materialize the board as an 8x8 list of tiles indexed by [x][y].
+        return [[self.get_tile(x, y) for y in range(8)] for x in range(8)]
+
+    def get_tile(self, x, y):
+        # Returns 'X', 'O', '.' (hint) or ' ' for the space at x, y.
+        bit = 1 << (y * 8 + x)
+        if self.black & bit:
+            return 'X'
+        elif self.white & bit:
+            return 'O'
+        elif self.hints & bit:
+            return '.'
+        return ' '
+
     def draw(self):
 
         h_line = '  +----+----+----+----+----+----+----+----+'
@@ -33,143 +67,107 @@ class Board:
         for y in range(8):
             print(y + 1, end=' ')
             for x in range(8):
-                print('| %s' % (self.board[x][y]), end='  ')
+                print('| %s' % (self.get_tile(x, y)), end='  ')
             print('|')
             print(h_line)
 
     def reset(self):
         # Blanks out the board it is passed, except for the original starting position.
-        for x in range(8):
-            for y in range(8):
-                self.board[x][y] = ' '
-
         # Starting pieces: X = black, O = white.
-        self.board[3][3] = 'X'
-        self.board[3][4] = 'O'
-        self.board[4][3] = 'O'
-        self.board[4][4] = 'X'
+        self.black = (1 << (3 * 8 + 3)) | (1 << (4 * 8 + 4))
+        self.white = (1 << (4 * 8 + 3)) | (1 << (3 * 8 + 4))
+        self.hints = 0
+        self._moves = {}
+
+    def get_bitboards(self, tile):
+        # Returns the (own, opponent) bitboards for the given player.
+        if tile == 'X':
+            return self.black, self.white
+        return self.white, self.black
+
+    def get_valid_moves_bitboard(self, tile):
+        # Returns a bitboard of the valid moves for the given player, cached until the board changes.
+        moves = self._moves.get(tile)
+        if moves is None:
+            moves = self._moves[tile] = cached_moves(*self.get_bitboards(tile))
+        return moves
 
     def is_valid_move(self, tile, x_start, y_start):
         # Returns False if the player's move on space x_start, y_start is invalid.
         # If it is a valid move, returns a list of spaces that would become the player's if they made a move here.
-        if self.board[x_start][y_start] != ' ' or not is_on_board(x_start, y_start):
+        if not is_on_board(x_start, y_start):
             return False
-
-        self.board[x_start][y_start] = tile  # temporarily set the tile on the board.
-
-        if tile == 'X':
-            other_tile = 'O'
-        else:
-            other_tile = 'X'
-
-        tiles_to_flip = []
-        for x_direction, y_direction in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
-            x, y = x_start, y_start
-            x += x_direction  # first step in the direction
-            y += y_direction  # first step in the direction
-            if is_on_board(x, y) and self.board[x][y] == other_tile:
-                # There is a piece belonging to the other player next to our piece.
-                x += x_direction
-                y += y_direction
-                if not is_on_board(x, y):
-                    continue
-                while self.board[x][y] == other_tile:
-                    x += x_direction
-                    y += y_direction
-                    if not is_on_board(x, y):  # break out of while loop, then continue in for loop
-                        break
-                if not is_on_board(x, y):
-                    continue
-                if self.board[x][y] == tile:
-                    # There are pieces to flip over. Go in the reverse direction until we reach the original space,
-                    # noting all the tiles along the way.
-                    while True:
-                        x -= x_direction
-                        y -= y_direction
-                        if x == x_start and y == y_start:
-                            break
-                        tiles_to_flip.append([x, y])
-
-        self.board[x_start][y_start] = ' '  # restore the empty space
-        if len(tiles_to_flip) == 0:  # If no tiles were flipped, this is not a valid move.
+        sq = y_start * 8 + x_start
+        # occupied spaces and spaces that flip no tiles are not in the valid moves
+        if not self.get_valid_moves_bitboard(tile) & (1 << sq):
             return False
-        return tiles_to_flip
+
+        flips = gen_flips(*self.get_bitboards(tile), sq)
+        return [[idx & 7, idx >> 3] for idx in _iter_bits(flips)]
 
     def get_valid_moves(self, tile):
         # Returns a list of [x,y] lists of valid moves for the given player on the given board.
-        valid_moves = []
+        # sorted so the moves come in the same x-major order as a scan over the board
+        moves = self.get_valid_moves_bitboard(tile)
+        return sorted([idx & 7, idx >> 3] for idx in _iter_bits(moves))
 
-        for x in range(8):
-            for y in range(8):
-                if self.is_valid_move(tile, x, y):
-                    valid_moves.append([x, y])
-        return valid_moves
+    def get_valid_moves_mask(self, tile):
+        # Returns a flat boolean array of length 64 that is True on the valid moves, indexed by y * 8 + x.
+        moves = self.get_valid_moves_bitboard(tile)
+        return np.unpackbits(np.array([moves], dtype='<u8').view(np.uint8), bitorder='little').astype(bool)
 
     def get_score(self):
         # Determine the score by counting the tiles. Returns a dictionary with keys 'X' and 'O'.
-        x_score = 0
-        o_score = 0
-        for x in range(8):
-            for y in range(8):
-                if self.board[x][y] == 'X':
-                    x_score += 1
-                elif self.board[x][y] == 'O':
-                    o_score += 1
-        return {'X': x_score, 'O': o_score}
+        return {'X': self.black.bit_count(), 'O': self.white.bit_count()}
 
     def make_move(self, tile, x_start, y_start):
         # Place the tile on the board at x_start, y_start, and flip any of the opponent's pieces.
         # Returns False if this is an invalid move, True if it is valid.
-        tiles_to_flip = self.is_valid_move(tile, x_start, y_start)
-
-        if not tiles_to_flip:
+        if not is_on_board(x_start, y_start):
+            return False
+        sq = y_start * 8 + x_start
+        if not self.get_valid_moves_bitboard(tile) & (1 << sq):
             return False
 
-        self.board[x_start][y_start] = tile
-        for x, y in tiles_to_flip:
-            self.board[x][y] = tile
+        own, opp = self.get_bitboards(tile)
+        flips = gen_flips(own, opp, sq)
+        placed = 1 << sq
+
+        self._moves = {}
+        if tile == 'X':
+            self.black ^= placed | flips
+            self.white ^= flips
+        else:
+            self.white ^= placed | flips
+            self.black ^= flips
         return True
 
     def copy(self):
-        # Make a duplicate of the board list and return the duplicate.
+        # Make a duplicate of the board and return the duplicate.
         dupe_board = Board()
-
-        for x in range(8):
-            for y in range(8):
-                dupe_board.board[x][y] = self.board[x][y]
-
+        dupe_board.black = self.black
+        dupe_board.white = self.white
         return dupe_board
 
     def copy_with_valid_moves(self, tile):
         # ONLY TO BE USED WITH PLAYER INTERACTION. NOT FOR TRAINING
         # Returns a new board with . marking the valid moves the given player can make.
         dupe_board = self.copy()
-
-        for x, y in dupe_board.get_valid_moves(tile):
-            dupe_board.board[x][y] = '.'
+        dupe_board.hints = self.get_valid_moves_bitboard(tile)
         return dupe_board
 
     def list_to_array(self):
-        state = np.zeros((8, 8))
-        for i in range(8):
-            for j in range(8):
-                if self.board[j][i] == 'X':
-                    state[i, j] = 1
-                elif self.board[j][i] == 'O':
-                    state[i, j] = -1
-                else:
-                    state[i, j] = 0
-        return state
+        # Returns an 8x8 array indexed by [y, x] with 1 for X, -1 for O and 0 for empty spaces.
+        bits = np.unpackbits(np.array([self.black, self.white], dtype='<u8').view(np.uint8), bitorder='little')
+        bits = bits.reshape(2, 8, 8).astype(np.int8)
+        return bits[0] - bits[1]
 
     def array_to_list(self, state):
-        for i in range(8):
-            for j in range(8):
-                if state[i, j] == 1:
-                    self.board[j][i] = 'X'
-                elif state[i, j] == -1:
-                    self.board[j][i] = 'O'
-                else:
-                    self.board[j][i] = ' '
+        # Inverse of list_to_array: loads the board from an 8x8 array indexed by [y, x].
+        state = np.asarray(state).ravel()
+        self._moves = {}
+        self.black = int(np.packbits(state == 1, bitorder='little').view('<u8')[0])
+        self.white = int(np.packbits(state == -1, bitorder='little').view('<u8')[0])
         return self.board
 
 
@@ -278,19 +276,20 @@ class OthelloGame:
 
         if possible_moves:
             if self.opponent == 'rand':
-                # randomize the order of the possible moves
-                random.shuffle(possible_moves)
-                return possible_moves[0]
+                return random.choice(possible_moves)
             else:
                 # TODO - update so that we choose the best afterstate, not just the best next position
+                # Score each afterstate by how much it changes the value of the board: the placed tile
+                # adds its square's value and every flipped tile swings its square's value twice.
+                sign = 1 if self.computer_tile == 'X' else -1
+                own, opp = self.board.get_bitboards(self.computer_tile)
                 computer_afterstate_v = []
-                for i in range(len(possible_moves)):
-                    computer_afterstate_v.append(0)
-                    temp_board = self.board.copy()
-                    temp_board.make_move(self.computer_tile, possible_moves[i][0], possible_moves[i][1])
-                    for j in range(64):
-                        computer_afterstate_v[i] -= temp_board.list_to_array()[int(j/8)][j % 8] * self.position_value[j]
-                best = int(np.argmax([computer_afterstate_v[k] for k in range(len(possible_moves))]))
+                for x, y in possible_moves:
+                    sq = y * 8 + x
+                    flips = gen_flips(own, opp, sq)
+                    gain = self.position_value[sq] + 2 * sum(self.position_value[i] for i in _iter_bits(flips))
+                    computer_afterstate_v.append(-sign * gain)
+                best = int(np.argmax(computer_afterstate_v))
                 return possible_moves[best]
         else:
             return []
@@ -333,10 +332,9 @@ class OthelloGame:
         #   2. Computer is now out of moves  ->  exit and let agent choose again
         #   3. Agent is now out of moves     ->  Let computer take a move
         #   4. Both still have moves         ->  let computer take 1 move
-        computer_moves = self.board.get_valid_moves(self.computer_tile)
-        if not computer_moves:
+        if not self.board.get_valid_moves_bitboard(self.computer_tile):
             # options 1 and 2
-            if not self.board.get_valid_moves(self.player_tile):
+            if not self.board.get_valid_moves_bitboard(self.player_tile):
                 # option 1 - game over
                 reward = self.calculate_final_reward()
                 terminal = True
@@ -353,9 +351,8 @@ class OthelloGame:
             computer_action = self.get_computer_move()
             self.board.make_move(self.computer_tile, computer_action[0], computer_action[1])
 
-        # check if the computer ended the game
-        if not self.board.get_valid_moves(self.player_tile) and \
-                not self.board.get_valid_moves(self.player_tile):
+        # check if the computer ended the game (or left the agent without a move)
+        if not self.board.get_valid_moves_bitboard(self.player_tile):
             terminal = True
             reward = self.calculate_final_reward()
         if self.stepper:
@@ -411,9 +408,9 @@ class OthelloGame:
                     else:
                         self.board.make_move(self.player_tile, player_action[0], player_action[1])
 
-                    if not self.board.get_valid_moves(self.computer_tile):
+                    if not self.board.get_valid_moves_bitboard(self.computer_tile):
                         print('Your opponent has no legal move. It is your turn.')
-                        if not self.board.get_valid_moves(self.player_tile):
+                        if not self.board.get_valid_moves_bitboard(self.player_tile):
                             print('You also have no legal move. The game is over.')
                             break
                         pass
@@ -428,9 +425,9 @@ class OthelloGame:
                     x, y, = c_move[0], c_move[1]
                     self.board.make_move(self.computer_tile, x, y)
 
-                    if not self.board.get_valid_moves(self.player_tile):
+                    if not self.board.get_valid_moves_bitboard(self.player_tile):
                         print('You have no legal move. It is the computer\'s turn.')
-                        if not self.board.get_valid_moves(self.computer_tile):
+                        if not self.board.get_valid_moves_bitboard(self.computer_tile):
                             print('Your opponent also has no legal move. The game is over.')
                             break
                         pass
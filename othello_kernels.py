@@ -0,0 +1,55 @@
+# Bitboard kernels for the 8x8 Othello board, compiled with Numba.
+# Square (x, y) is bit y * 8 + x of a uint64.
+
+import numpy as np
+from numba import njit, uint64, int64, boolean
+
+FULL = 0xffffffffffffffff
+NOT_A = 0xfefefefefefefefe  # every square except the x == 0 column
+NOT_H = 0x7f7f7f7f7f7f7f7f  # every square except the x == 7 column
+
+# shift amount for each pair of opposite directions, with the mask that drops the bits that
+# wrapped around a board edge when shifting left (towards higher squares) or right
+SHIFTS = np.array([1, 8, 9, 7], dtype=np.uint64)
+LEFT_MASKS = np.array([NOT_A, FULL, NOT_A, NOT_H], dtype=np.uint64)
+RIGHT_MASKS = np.array([NOT_H, FULL, NOT_H, NOT_A], dtype=np.uint64)
+
+
+@njit(uint64(uint64, uint64, uint64, boolean), cache=True)
+def shift(bb, n, mask, left):
+    # Shifts every bit of the bitboard one step in a direction.
+    if left:
+        return (bb << n) & mask
+    return (bb >> n) & mask
+
+
+@njit(uint64(uint64, uint64), cache=True)
+def gen_moves(own, opp):
+    # Returns a bitboard of the empty squares where own can move.
+    empty = ~(own | opp)
+    moves = uint64(0)
+    for i in range(4):
+        for left in (True, False):
+            mask = LEFT_MASKS[i] if left else RIGHT_MASKS[i]
+            # dumb7fill: at most 6 opponent pieces can sit between the move and our piece
+            x = shift(own, SHIFTS[i], mask, left) & opp
+            for _ in range(5):
+                x |= shift(x, SHIFTS[i], mask, left) & opp
+            moves |= shift(x, SHIFTS[i], mask, left) & empty
+    return moves
+
+
+@njit(uint64(uint64, uint64, int64), cache=True)
+def gen_flips(own, opp, sq):
+    # Returns a bitboard of the opponent's pieces flipped by own moving on square sq.
+    placed = uint64(1) << uint64(sq)
+    flips = uint64(0)
+    for i in range(4):
+        for left in (True, False):
+            mask = LEFT_MASKS[i] if left else RIGHT_MASKS[i]
+            x = shift(placed, SHIFTS[i], mask, left) & opp
+            for _ in range(5):
+                x |= shift(x, SHIFTS[i], mask, left) & opp
+            if shift(x, SHIFTS[i], mask, left) & own:
+                flips |= x
+    return flips